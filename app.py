@@ -1,13 +1,13 @@
 import json
 import re
-import io
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
 import streamlit as st
 from google.oauth2.credentials import Credentials
 from google.auth.transport.requests import Request
 from google.oauth2.service_account import Credentials as ServiceAccountCredentials
-from google_drive_manager import copy_disk, build_drive
+from google_drive_manager import COPY_WORKERS, copy_disk, build_drive, build_service, extract_id_from_url, share_refresh
 
 # --- SCOPES & REGEX ---
 SCOPES_DRIVE = [
@@ -23,6 +23,9 @@ EMAIL_REGEX = re.compile(
     r"(?:\.[A-Za-z0-9](?:[A-Za-z0-9-]{0,61}[A-Za-z0-9])?)+$"
 )
 
+# placeholdery szablonu e-maila — podmieniane w jednym przebiegu ([IMIE_NAZWISKO] przed gołym IMIE_NAZWISKO)
+_PLACEHOLDER_RE = re.compile(r'\[LINK_DO_GOOGLE_DRIVE\]|\[IMIE_NAZWISKO\]|IMIE_NAZWISKO|\[ACCENT\]')
+
 # --- CONFIG ---
 @st.cache_resource
 def load_config():
@@ -49,20 +52,56 @@ def load_config():
 CFG = load_config()
 
 # --- CREDS ---
+# odświeżanie tokenu: z wyprzedzeniem, gdy wygasa w ciągu minuty; równoległe odświeżenia
+# tych samych creds (także z pulowanych transportów) deduplikuje share_refresh
+REFRESH_MARGIN = timedelta(seconds=60)
+
+def _needs_refresh(creds: Credentials) -> bool:
+    now = datetime.now(timezone.utc).replace(tzinfo=None)  # google-auth trzyma expiry jako naiwne UTC
+    if creds.token and (creds.expiry is None or creds.expiry - now > REFRESH_MARGIN):
+        return False
+    return bool(creds.refresh_token)
+
+def _refresh_if_needed(creds: Credentials) -> None:
+    if _needs_refresh(creds):
+        creds.refresh(Request())  # share_refresh: jedno zapytanie na wszystkie wątki
+
+@st.cache_resource
+def _token_info(kind: str) -> dict:
+    """
+    Sparsowany st.secrets["token_<kind>"] (sekrety nie zmieniają się w trakcie działania).
+    Token może być JSON-em w stringu albo tabelą TOML — jak gcp_sa_drive.
+    """
+    val = st.secrets[f"token_{kind}"]
+    return json.loads(val) if isinstance(val, str) else dict(val)
+
+@st.cache_resource
+def _load_creds(kind: str) -> Credentials:
+    """
+    Obiekt creds ("drive" / "gmail") trzymany przez cały proces — access token przeżywa reruny,
+    a odświeżenie (w miejscu, przez share_refresh) widzą wszystkie sesje i zbudowane na nim klienty API.
+    """
+    if kind == "drive":
+        auth_mode = (CFG.get("google_drive", {}).get("auth") or "oauth").lower()
+        if auth_mode == "sa" and "gcp_sa_drive" in st.secrets:
+            sa_val = st.secrets["gcp_sa_drive"]
+            info = json.loads(sa_val) if isinstance(sa_val, str) else dict(sa_val)
+            return share_refresh(ServiceAccountCredentials.from_service_account_info(info, scopes=SCOPES_DRIVE))
+        # OAuth na koncie-bocie (domyślne)
+        return share_refresh(Credentials.from_authorized_user_info(_token_info("drive"), SCOPES_DRIVE))
+    return share_refresh(Credentials.from_authorized_user_info(_token_info("gmail"), SCOPES_GMAIL))
+
 def get_drive_creds() -> Credentials:
-    auth_mode = (CFG.get("google_drive", {}).get("auth") or "oauth").lower()
-    if auth_mode == "sa" and "gcp_sa_drive" in st.secrets:
-        sa_val = st.secrets["gcp_sa_drive"]
-        info = json.loads(sa_val) if isinstance(sa_val, str) else dict(sa_val)
-        return ServiceAccountCredentials.from_service_account_info(info, scopes=SCOPES_DRIVE)
-
-    # OAuth na koncie-bocie (domyślne)
-    data = json.loads(st.secrets["token_drive"])
-    creds = Credentials.from_authorized_user_info(data, SCOPES_DRIVE)
-    if not creds.valid and creds.expired and creds.refresh_token:
-        creds.refresh(Request())
+    creds = _load_creds("drive")
+    if isinstance(creds, Credentials):  # SA odświeża się sam przy pierwszym zapytaniu
+        _refresh_if_needed(creds)
     return creds
 
+@st.cache_resource
+def _drive_service():
+    """Klient Drive budowany raz na proces (creds odświeżają się same przy zapytaniach)."""
+    return build_drive(get_drive_creds())
+
 def gmail_creds_available() -> bool:
     try:
         _ = st.secrets["token_gmail"]
@@ -71,77 +110,149 @@ def gmail_creds_available() -> bool:
         return False
 
 def get_gmail_creds() -> Credentials:
-    data = json.loads(st.secrets["token_gmail"])
-    creds = Credentials.from_authorized_user_info(data, SCOPES_GMAIL)
-    if not creds.valid and creds.expired and creds.refresh_token:
-        creds.refresh(Request())
+    creds = _load_creds("gmail")
+    _refresh_if_needed(creds)
     return creds
 
 # --- EMAIL (Markdown -> HTML, multipart) ---
-import base64
-import markdown2
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from googleapiclient.discovery import build as gbuild
+import binascii
+from html import escape
+from string import Template
+
 import streamlit.components.v1 as components
+from email_template import TEMPLATE_HTML, TEMPLATE_MD, load_precompiled, md_to_html_parts, source_digest
+
+# ---- STAŁE SZABLONU E-MAILA ----
+_PAGE_GRADIENTS = {
+    "vibrant": "linear-gradient(135deg,#bae6fd 0%,#7dd3fc 25%,#60a5fa 55%,#a78bfa 100%)",
+    "pastel":  "linear-gradient(135deg,#ebf4ff 0%,#e0f2fe 50%,#f5f3ff 100%)",
+    "sunset":  "linear-gradient(135deg,#fecaca 0%,#fda4af 35%,#f0abfc 70%,#c4b5fd 100%)",
+}
+_TOP_STRIP_GRADIENTS = {
+    "vibrant": "linear-gradient(90deg,#0ea5e9,#22d3ee,#6366f1,#a855f7)",
+    "pastel":  "linear-gradient(90deg,#93c5fd,#a5f3fc,#c7d2fe,#f0abfc)",
+    "sunset":  "linear-gradient(90deg,#fb7185,#f59e0b,#ec4899,#8b5cf6)",
+}
+_FONT_STACK = "system-ui,-apple-system,Segoe UI,Roboto,Ubuntu,'Helvetica Neue',Arial,sans-serif"
+_BOTTOM_SECTION_OPEN = f'<div style="padding:24px;font-family:{_FONT_STACK};line-height:1.6;color:#0f172a;">'
+
+# szkielet HTML e-maila — kompilowany raz, per wiadomość tylko podstawienie zmiennych
+_EMAIL_SHELL = Template(f"""<!doctype html>
+<html>
+  <body style="margin:0;padding:0;background:$page_bg;">
+    <div style="background:$page_bg;padding:24px 0;">
+      <div style="max-width:640px;margin:0 auto;padding:0 24px;">
+        <div style="background:#ffffff;border-radius:16px;box-shadow:0 6px 20px rgba(2,6,23,.10);
+                    border:1px solid #e5e7eb;overflow:hidden;">
+          <div style="height:10px;background:$top_strip;"></div>
+
+          <!-- SEKCJA Z GRADIENTEM (nad '---') -->
+          <div style="background:$page_grad;padding:24px;">
+            <div style="font-family:{_FONT_STACK};
+                        line-height:1.6;color:#0f172a;">
+              $brand_html
+              <div>$html_top</div>
+            </div>
+            <div style="height:1px;background:rgba(15,23,42,.22);margin-top:14px;"></div>
+          </div>
+
+          <!-- SEKCJA BIAŁA (po '---') -->
+          $html_bottom_block
+        </div>
+
+        <div style="font-family:{_FONT_STACK};
+                    color:#64748b;font-size:12px;margin-top:12px;text-align:center;">
+          $footer
+        </div>
+      </div>
+    </div>
+  </body>
+</html>""")
+
+def _mtime(p: Path) -> float | None:
+    try:
+        return p.stat().st_mtime
+    except FileNotFoundError:
+        return None
+
+# szablony czytane z dysku raz na wersję pliku — mtime w kluczu cache, więc edycja działa bez restartu
+@st.cache_data(show_spinner=False)
+def _read_text_cached(path: str, mtime: float) -> str:
+    return Path(path).read_text(encoding="utf-8")
 
 def load_email_md_from_disk_or_cfg() -> str:
     """Najpierw spróbuj wczytać templates/email.md, a jeśli brak — weź z configu."""
-    p = Path("templates/email.md")
-    if p.exists():
-        return p.read_text(encoding="utf-8")
+    mtime = _mtime(TEMPLATE_MD)
+    if mtime is not None:
+        return _read_text_cached(str(TEMPLATE_MD), mtime)
     return CFG.get("email", {}).get("body_md") or CFG.get("email", {}).get("body") or \
            "Cześć!\n[LINK_DO_GOOGLE_DRIVE]"
 
+@st.cache_resource
+def _load_precompiled_cached(mtime: float | None) -> tuple[str, str, str] | None:
+    return load_precompiled()
+
+def load_precompiled_html() -> tuple[str, str, str] | None:
+    """templates/email.html.tmpl (python email_template.py) — (src_digest, html_top, html_bottom) albo None."""
+    return _load_precompiled_cached(_mtime(TEMPLATE_HTML))
+
 def render_email_body_from_md(md_template: str, link: str, full_name: str) -> tuple[str, str]:
     """
     Buduje treść e-maila na podstawie Markdowna (md_template) z placeholderami:
     [LINK_DO_GOOGLE_DRIVE], [IMIE_NAZWISKO] / IMIE_NAZWISKO oraz [ACCENT].
     Zwraca (plain_text_md, html_email).
     """
-    import re
-    import markdown2
+    # ---- PREKOMPILOWANY HTML (tylko gdy powstał z tego samego Markdowna) ----
+    precompiled = load_precompiled_html()
+    html_parts = precompiled[1:] if precompiled and precompiled[0] == source_digest(md_template) else None
 
     # ---- BRAND / CONFIG ----
     brand = CFG.get("brand", {}) if isinstance(CFG, dict) else {}
-    brand_name = brand.get("name")  # jeśli None/"" → nagłówek nie będzie renderowany
-    accent = brand.get("accent", "#0ea5e9")
-    footer = brand.get("footer", "")
-    grad_style = (brand.get("gradient_style") or "vibrant").lower()
-    page_bg_solid = brand.get("page_bg") or "#FFF7ED"  # stałe, kremowe tło poza kartą
+    return _render_email_body_cached(
+        md_template,
+        link,
+        full_name,
+        accent=brand.get("accent", "#0ea5e9"),
+        footer=brand.get("footer", ""),
+        grad_style=(brand.get("gradient_style") or "vibrant").lower(),
+        page_bg=brand.get("page_bg") or "#FFF7ED",  # stałe, kremowe tło poza kartą
+        brand_name=brand.get("name"),  # jeśli None/"" → nagłówek nie będzie renderowany
+        html_parts=html_parts,
+    )
 
+@st.cache_data(show_spinner=False, max_entries=128)
+def _render_email_body_cached(
+    md_template: str,
+    link: str,
+    full_name: str,
+    accent: str,
+    footer: str,
+    grad_style: str,
+    page_bg: str,
+    brand_name: str | None,
+    html_parts: tuple[str, str] | None = None,
+) -> tuple[str, str]:
+    """Czysta część renderowania — wynik zależy tylko od argumentów, więc reruny biorą go z cache."""
     # ---- GRADIENTY ----
-    page_gradients = {
-        "vibrant": "linear-gradient(135deg,#bae6fd 0%,#7dd3fc 25%,#60a5fa 55%,#a78bfa 100%)",
-        "pastel":  "linear-gradient(135deg,#ebf4ff 0%,#e0f2fe 50%,#f5f3ff 100%)",
-        "sunset":  "linear-gradient(135deg,#fecaca 0%,#fda4af 35%,#f0abfc 70%,#c4b5fd 100%)",
-    }
-    top_strip_gradients = {
-        "vibrant": "linear-gradient(90deg,#0ea5e9,#22d3ee,#6366f1,#a855f7)",
-        "pastel":  "linear-gradient(90deg,#93c5fd,#a5f3fc,#c7d2fe,#f0abfc)",
-        "sunset":  "linear-gradient(90deg,#fb7185,#f59e0b,#ec4899,#8b5cf6)",
-    }
-    page_grad = page_gradients.get(grad_style, page_gradients["vibrant"])
-    top_strip = top_strip_gradients.get(grad_style, top_strip_gradients["vibrant"])
+    page_grad = _PAGE_GRADIENTS.get(grad_style, _PAGE_GRADIENTS["vibrant"])
+    top_strip = _TOP_STRIP_GRADIENTS.get(grad_style, _TOP_STRIP_GRADIENTS["vibrant"])
 
     # ---- PODMIANA PLACEHOLDERÓW ----
-    md = (
-        md_template
-        .replace("[LINK_DO_GOOGLE_DRIVE]", link)
-        .replace("[IMIE_NAZWISKO]", full_name)
-        .replace("IMIE_NAZWISKO", full_name)
-        .replace("[ACCENT]", accent)
-    )
+    subs = {
+        "[LINK_DO_GOOGLE_DRIVE]": link,
+        "[IMIE_NAZWISKO]": full_name,
+        "IMIE_NAZWISKO": full_name,
+        "[ACCENT]": accent,
+    }
+    md = _PLACEHOLDER_RE.sub(lambda m: subs[m.group(0)], md_template)
 
-    # ---- DZIELENIE NA CZĘŚĆ NAD I POD '---' ----
-    parts = re.split(r'^\s*(?:-{3,}|_{3,}|\*{3,})\s*$', md, maxsplit=1, flags=re.MULTILINE)
-    if len(parts) == 2:
-        md_top, md_bottom = parts
+    # ---- HTML CZĘŚCI NAD I POD '---' ----
+    if html_parts is not None:
+        # szablon już sparsowany — tylko podmiana placeholderów (wartości wstawiane do HTML-a)
+        html_subs = {k: escape(v) for k, v in subs.items()}
+        html_top, html_bottom = (_PLACEHOLDER_RE.sub(lambda m: html_subs[m.group(0)], part) for part in html_parts)
     else:
-        md_top, md_bottom = md, ""
-
-    html_top = markdown2.markdown(md_top, extras=["break-on-newline", "fenced-code-blocks", "tables"])
-    html_bottom = markdown2.markdown(md_bottom, extras=["break-on-newline", "fenced-code-blocks", "tables"]) if md_bottom else ""
+        html_top, html_bottom = md_to_html_parts(md)
 
     # ---- OPCJONALNY NAGŁÓWEK MARKI ----
     brand_html = (
@@ -151,38 +262,19 @@ def render_email_body_from_md(md_template: str, link: str, full_name: str) -> tu
         if brand_name else ""
     )
 
-    # ---- HTML CAŁOŚCI ----
-    html = f"""<!doctype html>
-<html>
-  <body style="margin:0;padding:0;background:{page_bg_solid};">
-    <div style="background:{page_bg_solid};padding:24px 0;">
-      <div style="max-width:640px;margin:0 auto;padding:0 24px;">
-        <div style="background:#ffffff;border-radius:16px;box-shadow:0 6px 20px rgba(2,6,23,.10);
-                    border:1px solid #e5e7eb;overflow:hidden;">
-          <div style="height:10px;background:{top_strip};"></div>
-
-          <!-- SEKCJA Z GRADIENTEM (nad '---') -->
-          <div style="background:{page_grad};padding:24px;">
-            <div style="font-family:system-ui,-apple-system,Segoe UI,Roboto,Ubuntu,'Helvetica Neue',Arial,sans-serif;
-                        line-height:1.6;color:#0f172a;">
-              {brand_html}
-              <div>{html_top}</div>
-            </div>
-            <div style="height:1px;background:rgba(15,23,42,.22);margin-top:14px;"></div>
-          </div>
-
-          <!-- SEKCJA BIAŁA (po '---') -->
-          {"<div style='padding:24px;font-family:system-ui,-apple-system,Segoe UI,Roboto,Ubuntu,Helvetica Neue,Arial,sans-serif;line-height:1.6;color:#0f172a;'>" + html_bottom + "</div>" if html_bottom else ""}
-        </div>
+    # ---- SEKCJA BIAŁA (po '---') ----
+    html_bottom_block = _BOTTOM_SECTION_OPEN + html_bottom + "</div>" if html_bottom else ""
 
-        <div style="font-family:system-ui,-apple-system,Segoe UI,Roboto,Ubuntu,'Helvetica Neue',Arial,sans-serif;
-                    color:#64748b;font-size:12px;margin-top:12px;text-align:center;">
-          {footer}
-        </div>
-      </div>
-    </div>
-  </body>
-</html>"""
+    # ---- HTML CAŁOŚCI ----
+    html = _EMAIL_SHELL.substitute(
+        page_bg=page_bg,
+        top_strip=top_strip,
+        page_grad=page_grad,
+        brand_html=brand_html,
+        html_top=html_top,
+        html_bottom_block=html_bottom_block,
+        footer=footer,
+    )
 
     # plain-text → zwracamy Markdown z podmienionymi placeholderami
     return md, html
@@ -190,26 +282,95 @@ def render_email_body_from_md(md_template: str, link: str, full_name: str) -> tu
 
 
 
-def send_email_gmail_multipart(creds: Credentials, to_addr: str, subject: str, text_body: str, html_body: str) -> str:
-    service = gbuild("gmail", "v1", credentials=creds)
-    msg = MIMEMultipart("alternative")
-    msg["to"] = to_addr
-    msg["subject"] = subject
-    msg.attach(MIMEText(text_body, "plain", "utf-8"))
-    msg.attach(MIMEText(html_body, "html", "utf-8"))
-    raw = base64.urlsafe_b64encode(msg.as_bytes()).decode()
+@st.cache_resource
+def _gmail_service():
+    """Klient Gmail budowany raz na proces (pula połączeń jak dla Drive); dokument discovery z paczki."""
+    return build_service("gmail", "v1", get_gmail_creds(), cache_discovery=False, static_discovery=True)
+
+# multipart/alternative składany ręcznie: obie części zawsze UTF-8/base64, więc nie potrzeba drzewa MIME
+_MIME_BOUNDARY = "=_b"  # '=_' nie występuje w treści base64, więc granica nie koliduje z częściami
+_B64_URLSAFE = bytes.maketrans(b"+/", b"-_")
+
+def _b64_part(content_type: str, body: str) -> bytes:
+    import base64
+    encoded = base64.encodebytes(body.encode("utf-8")).replace(b"\n", b"\r\n")  # linie po 76 znaków
+    return (
+        f"--{_MIME_BOUNDARY}\r\n"
+        f"Content-Type: {content_type}; charset=\"utf-8\"\r\n"
+        f"Content-Transfer-Encoding: base64\r\n\r\n"
+    ).encode("ascii") + encoded
+
+def build_multipart_alternative(to_addr: str, subject: str, text_body: str, html_body: str) -> bytes:
+    from email.header import Header
+    from email.utils import formataddr
+
+    # zawinięte linie nagłówka też muszą kończyć się CRLF (domyślnie Header używa samego \n)
+    encoded_subject = Header(subject, "utf-8").encode(linesep="\r\n")
+    headers = (
+        f"To: {formataddr(('', to_addr))}\r\n"
+        f"Subject: {encoded_subject}\r\n"
+        f"MIME-Version: 1.0\r\n"
+        f"Content-Type: multipart/alternative; boundary=\"{_MIME_BOUNDARY}\"\r\n\r\n"
+    ).encode("ascii")
+    return (
+        headers
+        + _b64_part("text/plain", text_body)
+        + _b64_part("text/html", html_body)
+        + f"--{_MIME_BOUNDARY}--\r\n".encode("ascii")
+    )
+
+def send_email_gmail_multipart(service, to_addr: str, subject: str, text_body: str, html_body: str) -> str:
+    message = build_multipart_alternative(to_addr, subject, text_body, html_body)
+    # = base64.urlsafe_b64encode(message).decode(), ale w C i bez pośrednich kopii;
+    # Gmail przyjmuje base64url bez paddingu
+    raw = binascii.b2a_base64(message, newline=False).translate(_B64_URLSAFE).rstrip(b"=").decode("ascii")
     body = {"raw": raw}
     sent = service.users().messages().send(userId="me", body=body).execute()
     return sent.get("id")
 
 # --- Helpers ---
+# walidatory dostają już przycięte (.strip()) wartości z formularza
 def valid_email(s: str) -> bool:
-    return bool(s and EMAIL_REGEX.match(s.strip()))
+    # tani filtr przed regexem: długość wg RFC 5321 i dokładnie jedna '@'
+    if not s or not 3 <= len(s) <= 254 or s.count("@") != 1:
+        return False
+    return bool(EMAIL_REGEX.match(s))
 
 def valid_full_name(s: str) -> bool:
-    s = (s or "").strip()
+    s = s or ""
     return len(s) >= 3 and (" " in s or "-" in s)
 
+@st.cache_data(ttl=300, show_spinner=False)
+def _sa_probe(sa_email: str, source_folder: str) -> dict:
+    """
+    Metadane folderu źródłowego widziane przez konto Drive (sa_email jest tylko kluczem cache).
+    Sukces pamiętany 5 min; wyjątki (np. 404 przy braku dostępu) nie trafiają do cache.
+    """
+    from google_drive_manager import get_file
+    return get_file(_drive_service(), _source_id(source_folder))
+
+@st.cache_data(show_spinner=False)
+def _source_id(source_folder: str) -> str:
+    """ID folderu źródłowego z URL-a/ID w secrets (stałe dla wdrożenia; błędny wpis nie trafia do cache)."""
+    return extract_id_from_url(source_folder)
+
+def _throttled_steps(run, bar, min_delta: int = 5):
+    """
+    Zwraca step(label, pct): zmienia etykietę kontenera st.status (gdy label != None)
+    i przesuwa pasek, ale wysyła go do przeglądarki tylko przy zmianie o ≥ min_delta pkt (albo na 100).
+    """
+    last = 0
+
+    def step(label: str | None, pct: int):
+        nonlocal last
+        if label:
+            run.update(label=label)
+        if pct - last >= min_delta or (pct == 100 and last != 100):
+            bar.progress(pct)
+            last = pct
+
+    return step
+
 # --- UI ---
 st.set_page_config(page_title="Kopia materiałów", page_icon="📁", layout="centered")
 st.title("Uzyskaj swoją kopię materiałów 📁")
@@ -221,92 +382,90 @@ with st.form("copy_form", clear_on_submit=False):
     submitted = st.form_submit_button("Zatwierdź", type="primary")
 
 status = st.empty()
-progress = st.progress(0)
 result = st.empty()
 
 if st.button("🔎 Test: czy SA widzi folder źródłowy?"):
+    sa_info = st.secrets.get("gcp_sa_drive")
+    sa_email = sa_info.get("client_email") if isinstance(sa_info, dict) else "drive-bot@…"
     try:
-        drive_creds = get_drive_creds()
-        drive = build_drive(drive_creds)
-        from google_drive_manager import extract_id_from_url, get_file
-        src = st.secrets.get("source_folder")
-        src_id = extract_id_from_url(src)
-        meta = get_file(drive, src_id)  # 404 jeśli brak dostępu
+        meta = _sa_probe(sa_email, st.secrets.get("source_folder"))
         st.success(f"OK: SA widzi „{meta.get('name')}” (ID: {meta.get('id')})")
     except Exception as e:
         st.error("SA nadal nie ma dostępu do folderu. Upewnij się, że udostępniasz **folder** (albo dodaj SA do Dysku współdzielonego).")
-        st.code(st.secrets.get("gcp_sa_drive").get("client_email") if isinstance(st.secrets.get("gcp_sa_drive"), dict) else "drive-bot@…", language="text")
+        st.code(sa_email, language="text")
         with st.expander("Szczegóły błędu"):
             st.exception(e)
 
 
 if submitted:
+    full_name = full_name.strip()
+    email = email.strip()
     if not valid_full_name(full_name):
         st.error("Podaj poprawne imię i nazwisko (np. „Jan Kowalski”).")
     elif not valid_email(email):
         st.error("Podaj poprawny adres e-mail (np. jan.kowalski@example.com).")
     else:
+        # jeden kontener st.status zamiast osobnych komunikatów; pasek wysyłany tylko przy zmianie ≥ 5 pkt
+        run = status.status("Tworzenie kopii…", expanded=True)
+        step = _throttled_steps(run, run.progress(0))
         try:
-            status.info("🔐 Uzyskiwanie dostępu do Dysku Google…")
-            progress.progress(10)
-            drive_creds = get_drive_creds()
-            drive = build_drive(drive_creds)
+            step("🔐 Uzyskiwanie dostępu do Dysku Google…", 10)
+            drive = _drive_service()
 
-            status.info("🧭 Sprawdzanie konfiguracji źródła…")
-            progress.progress(30)
+            step("🧭 Sprawdzanie konfiguracji źródła…", 30)
             source_folder = st.secrets.get("source_folder")
             if not source_folder:
                 raise RuntimeError("Brak konfiguracji: `source_folder` w secrets.")
 
-            status.info("📦 Klonowanie folderu i ustawianie udostępniania…")
-            progress.progress(70)
+            step("📦 Klonowanie folderu i ustawianie udostępniania…", 70)
 
             # nazwa z configu + polityka udostępniania
             name_template = CFG.get("google_drive", {}).get("root_name_template")
             anyone_role = CFG.get("google_drive", {}).get("anyone_role", "writer")  # "reader"/"commenter"/"writer"/None
             lock_share = CFG.get("google_drive", {}).get("lock_editors_sharing", True)
             dest_parent = CFG.get("google_drive", {}).get("destination_parent")
+            copy_workers = int(CFG.get("google_drive", {}).get("copy_concurrency") or COPY_WORKERS)
             cloned = copy_disk(
                 drive,
-                source_folder,
-                full_name=full_name.strip(),
+                _source_id(source_folder),
+                full_name=full_name,
                 anyone_role=anyone_role,
                 root_name_template=name_template,
                 lock_editors_sharing=lock_share,
-                dst_parent_id=dest_parent
+                dst_parent_id=dest_parent,
+                max_workers=copy_workers,
+                progress_cb=lambda done, total: step(None, 70 + 15 * done // max(total, 1)),
             )
             link = cloned.get("webViewLink")
             folder_name = cloned.get("name", "Nowy folder")
             if not link:
                 raise RuntimeError("Nie uzyskano linku do sklonowanego folderu.")
 
-            status.info("✉️ Przygotowywanie wiadomości e-mail…")
-            progress.progress(85)
+            step("✉️ Przygotowywanie wiadomości e-mail…", 85)
             subject = CFG.get("email", {}).get("subject", "Twoje materiały – link do Dysku Google")
             body_md = load_email_md_from_disk_or_cfg()
-            text_body, html_body = render_email_body_from_md(body_md, link, full_name.strip())
+            text_body, html_body = render_email_body_from_md(body_md, link, full_name)
 
             if gmail_creds_available():
-                status.info("🚀 Wysyłanie wiadomości e-mail…")
-                progress.progress(95)
-                gmail_creds = get_gmail_creds()
+                step("🚀 Wysyłanie wiadomości e-mail…", 95)
                 msg_id = send_email_gmail_multipart(
-                    gmail_creds,
-                    to_addr=email.strip(),
+                    _gmail_service(),
+                    to_addr=email,
                     subject=subject,
                     text_body=text_body,
                     html_body=html_body
                 )
 
-                progress.progress(100)
-                status.success("Gotowe! Wysłaliśmy wiadomość z linkiem.")
+                step("Gotowe! Wysłaliśmy wiadomość z linkiem.", 100)
+                run.update(state="complete", expanded=False)
                 result.success(
                     f"✅ **{folder_name}** — [Otwórz sklonowany folder]({link})\n\n"
-                    f"📩 Wiadomość wysłana na **{email.strip()}** (ID: `{msg_id}`)"
+                    f"📩 Wiadomość wysłana na **{email}** (ID: `{msg_id}`)"
                 )
             else:
-                progress.progress(100)
-                status.warning("Brak konfiguracji wysyłki e-mail (token_gmail). Poniżej podgląd wiadomości do ręcznego wysyłania.")
+                step("Folder gotowy — e-mail do wysłania ręcznie.", 100)
+                run.update(state="complete", expanded=False)
+                st.warning("Brak konfiguracji wysyłki e-mail (token_gmail). Poniżej podgląd wiadomości do ręcznego wysyłania.")
                 result.markdown(f"✅ **{folder_name}** — [Otwórz sklonowany folder]({link})")
 
                 st.subheader("Podgląd wiadomości (Markdown → HTML)")
@@ -314,15 +473,14 @@ if submitted:
                 components.html(html_body, height=420, scrolling=True)
 
                 st.download_button("📥 Pobierz treść e-maila (.txt)",
-                                   data=io.BytesIO(text_body.encode("utf-8")),
+                                   data=text_body.encode("utf-8"),
                                    file_name="wiadomosc.txt", mime="text/plain")
                 st.download_button("📥 Pobierz treść e-maila (.html)",
-                                   data=io.BytesIO(html_body.encode("utf-8")),
+                                   data=html_body.encode("utf-8"),
                                    file_name="wiadomosc.html", mime="text/html")
 
         except Exception as e:
             status.empty()
-            progress.empty()
             st.error("Coś poszło nie tak podczas tworzenia kopii lub wysyłki e-maila.")
             with st.expander("Pokaż szczegóły błędu"):
                 st.exception(e)
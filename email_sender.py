@@ -15,7 +15,7 @@ class EmailSender:
         self.creds_file = creds_file
         self.token_file = token_file
         self.creds = self._get_creds()
-        self.service = build("gmail", "v1", credentials=self.creds)
+        self.service = build("gmail", "v1", credentials=self.creds, cache_discovery=False, static_discovery=True)
 
     def _get_creds(self):
         creds = None
@@ -52,7 +52,7 @@ class EmailSender:
         message["to"] = email_adres
         message["subject"] = title
 
-        raw = base64.urlsafe_b64encode(message.as_bytes()).decode()
+        raw = base64.urlsafe_b64encode(message.as_bytes()).rstrip(b"=").decode("ascii")
         body = {"raw": raw}
 
         sent_message = (
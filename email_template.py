@@ -0,0 +1,91 @@
+"""
+Szablon e-maila: Markdown -> HTML.
+
+Parsowanie Markdowna jest potrzebne tylko raz na wersję szablonu, więc
+templates/email.md można prekompilować do templates/email.html.tmpl:
+
+    python email_template.py
+
+W pliku .tmpl placeholdery ([LINK_DO_GOOGLE_DRIVE], [IMIE_NAZWISKO] / IMIE_NAZWISKO,
+[ACCENT]) zostają w postaci dosłownej, a per wiadomość wystarczy je podmienić.
+Pierwsza linia zawiera skrót źródłowego Markdowna — jeśli email.md zmieni się
+bez ponownej prekompilacji, app.py wraca do parsowania w locie.
+"""
+from __future__ import annotations
+import functools
+import hashlib
+import re
+from pathlib import Path
+from typing import Optional, Tuple
+
+TEMPLATE_MD = Path("templates/email.md")
+TEMPLATE_HTML = Path("templates/email.html.tmpl")
+
+# linia pozioma ('---', '___', '***') dzieląca szablon e-maila na dwie sekcje
+_HR_SPLIT = re.compile(r'^\s*(?:-{3,}|_{3,}|\*{3,})\s*$', re.MULTILINE)
+
+# mistune koduje nawiasy w URL-ach linków Markdowna ([x]([LINK_DO_GOOGLE_DRIVE]) -> %5B...%5D)
+_ENCODED_PLACEHOLDER_RE = re.compile(r"%5B(LINK_DO_GOOGLE_DRIVE|IMIE_NAZWISKO|ACCENT)%5D")
+
+_DIGEST_PREFIX = "<!-- src-sha1: "
+_SECTION_MARK = "\n<!-- ---8<--- -->\n"
+
+
+@functools.lru_cache(maxsize=None)
+def _parser():
+    """
+    Jeden parser na cały proces (break-on-newline / tabele / fenced code jak wcześniej w markdown2).
+    mistune importowany leniwie — przy prekompilowanym szablonie nie jest w ogóle potrzebny.
+    """
+    import mistune
+    return mistune.create_markdown(escape=False, hard_wrap=True, plugins=["strikethrough", "table", "url"])
+
+
+def source_digest(md: str) -> str:
+    return hashlib.sha1(md.encode("utf-8")).hexdigest()
+
+
+def md_to_html_parts(md: str) -> Tuple[str, str]:
+    """
+    Dzieli Markdown na część nad i pod pierwszą linią poziomą i renderuje obie.
+    Zwraca (html_top, html_bottom); html_bottom == "" gdy brak podziału.
+    """
+    parts = _HR_SPLIT.split(md, maxsplit=1)
+    if len(parts) == 2:
+        md_top, md_bottom = parts
+    else:
+        md_top, md_bottom = md, ""
+    render = _parser()
+    return render(md_top), render(md_bottom) if md_bottom else ""
+
+
+def precompile(src: Path = TEMPLATE_MD, dst: Path = TEMPLATE_HTML) -> Path:
+    md = src.read_text(encoding="utf-8")
+    html_top, html_bottom = (
+        _ENCODED_PLACEHOLDER_RE.sub(r"[\1]", part) for part in md_to_html_parts(md)
+    )
+    dst.write_text(
+        f"{_DIGEST_PREFIX}{source_digest(md)} -->\n{html_top}{_SECTION_MARK}{html_bottom}",
+        encoding="utf-8",
+    )
+    return dst
+
+
+def load_precompiled(path: Path = TEMPLATE_HTML) -> Optional[Tuple[str, str, str]]:
+    """
+    Wczytuje prekompilowany szablon. Zwraca (src_digest, html_top, html_bottom)
+    albo None, gdy pliku brak lub ma nieznany format.
+    """
+    if not path.exists():
+        return None
+    header, _, body = path.read_text(encoding="utf-8").partition("\n")
+    if not header.startswith(_DIGEST_PREFIX) or _SECTION_MARK not in body:
+        return None
+    digest = header[len(_DIGEST_PREFIX):].removesuffix(" -->")
+    html_top, html_bottom = body.split(_SECTION_MARK, 1)
+    return digest, html_top, html_bottom
+
+
+if __name__ == "__main__":
+    out = precompile()
+    print(f"Zapisano {out}")
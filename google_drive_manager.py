@@ -1,15 +1,26 @@
 from __future__ import annotations
+import functools
+import hashlib
+import json
 import os
+import random
 import re
+import threading
 import time
-from typing import Optional, Tuple, Iterable, Dict, Any
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager, nullcontext
+from typing import Optional, Tuple, Iterable, Dict, Any, Callable, List
 
+import httplib2
 from google.auth.exceptions import RefreshError
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
 
 # Scopes – przy kopiowaniu natywnych plików Google warto mieć Docs/Sheets
 SCOPES = [
@@ -18,92 +29,357 @@ SCOPES = [
     "https://www.googleapis.com/auth/spreadsheets",
 ]
 
+BATCH_LIMIT = 100  # max. liczba sub-requestów w jednym batchu Drive API
+COPY_WORKERS = 8   # ile batchy kopiowania leci równolegle
+LIST_PARENTS_PER_QUERY = 50  # ile folderów w jednym files.list (limit długości q/URL)
+HTTP_TIMEOUT = 30  # s, limit na jedno zwykłe zapytanie HTTP
+# batch niesie do BATCH_LIMIT files.copy, a każde może trwać po kilka sekund po stronie serwera;
+# timeoutu nie ponawiamy (kopie nie są idempotentne), więc limit musi objąć cały batch z zapasem
+BATCH_HTTP_TIMEOUT = 600
+
 FOLDER_MIME = "application/vnd.google-apps.folder"
 SHORTCUT_MIME = "application/vnd.google-apps.shortcut"
 PLACEHOLDER_TOKEN = "IMIE_NAZWISKO"  # dokładnie taki ciąg podmieniamy
+# metadane czytane przy klonowaniu; ze skrótu tylko cel (bez targetResourceKey)
+FILE_FIELDS = "id,name,mimeType,shortcutDetails(targetId,targetMimeType)"
 
 # ----------------------------
 # Autoryzacja (użyteczne do testów CLI)
 # ----------------------------
+_creds_lock = threading.Lock()
+# osobny lock na token.json: zapis wołany z odświeżenia w transporcie nie może czekać na _creds_lock,
+# bo get_creds trzyma go, czekając na to samo odświeżenie
+_token_file_lock = threading.Lock()
+_creds: Optional[Credentials] = None
+_saved_token: Optional[str] = None  # access token ostatnio zapisany w token.json
+
+
+def _save_token(creds: Credentials):
+    global _saved_token
+    with _token_file_lock:
+        if creds.token == _saved_token:
+            return
+        with open("token.json", "w") as f:
+            f.write(creds.to_json())
+        _saved_token = creds.token
+
+
 def get_creds() -> Credentials:
     """
     Lokalna autoryzacja do testów (credentials.json -> token.json).
     W produkcji (Streamlit) przekaż gotowe creds zewnętrznie.
+    Jeden obiekt na proces: wątki (i pula AuthorizedHttp) dzielą token. Każde odświeżenie —
+    także z before_request w transportach podczas długiego klonowania — idzie przez
+    share_refresh (jedno na raz) i kończy się zapisem token.json, o ile token się zmienił.
     """
-    creds: Optional[Credentials] = None
-    if os.path.exists("token.json"):
-        creds = Credentials.from_authorized_user_file("token.json", SCOPES)
-
-    def do_full_auth() -> Credentials:
-        flow = InstalledAppFlow.from_client_secrets_file("credentials.json", SCOPES)
-        new_creds = flow.run_local_server(port=0)
-        with open("token.json", "w") as f:
-            f.write(new_creds.to_json())
-        return new_creds
-
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            try:
-                creds.refresh(Request())
-                with open("token.json", "w") as f:
-                    f.write(creds.to_json())
-            except RefreshError:
+    global _creds, _saved_token
+    with _creds_lock:
+        creds = _creds
+        if creds is None and os.path.exists("token.json"):
+            creds = Credentials.from_authorized_user_file("token.json", SCOPES)
+            _saved_token = creds.token
+
+        def do_full_auth() -> Credentials:
+            flow = InstalledAppFlow.from_client_secrets_file("credentials.json", SCOPES)
+            new_creds = flow.run_local_server(port=0)
+            _save_token(new_creds)
+            return new_creds
+
+        if not creds or not creds.valid:
+            if creds and creds.expired and creds.refresh_token:
                 try:
-                    os.remove("token.json")
-                except FileNotFoundError:
-                    pass
+                    share_refresh(creds, on_refreshed=_save_token).refresh(Request())
+                except RefreshError:
+                    try:
+                        os.remove("token.json")
+                    except FileNotFoundError:
+                        pass
+                    creds = do_full_auth()
+            else:
                 creds = do_full_auth()
-        else:
-            creds = do_full_auth()
+        _creds = share_refresh(creds, on_refreshed=_save_token)
+        return _creds
+
+
+# ----------------------------
+# Wspólne odświeżanie tokenu
+# ----------------------------
+# równoległe odświeżenia tych samych creds (wątki, pula AuthorizedHttp, ponowienie po 401) → jedno zapytanie;
+# klucz obejmuje obiekt creds — dwa obiekty z tym samym grantem (np. token_drive == token_gmail)
+# odświeżają się osobno, bo czekający dostaje tylko wynik, a nie nowy token
+_refresh_lock = threading.Lock()
+_refresh_inflight: Dict[Tuple[int, str], Future] = {}
+
+
+@functools.lru_cache(maxsize=8)
+def _token_key(secret: str) -> str:
+    """Krótki klucz creds do mapy odświeżeń — liczony raz na sekret, sam sekret nie trafia do kluczy."""
+    return hashlib.blake2b(secret.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def share_refresh(creds, on_refreshed: Optional[Callable[[Any], None]] = None):
+    """
+    Podmienia `creds.refresh` tak, by każde odświeżenie — także to z before_request
+    w pulowanych AuthorizedHttp — przechodziło przez wspólną deduplikację: pierwszy wątek
+    odpytuje endpoint tokenów, pozostałe czekają na jego wynik (albo wyjątek), a wątek,
+    który przyszedł po fakcie (token już inny niż ten, który uznał za nieważny), nic nie robi.
+    `on_refreshed(creds)` jest wołane raz po każdym udanym odświeżeniu (np. zapis token.json).
+    Zwraca te same creds.
+    """
+    if getattr(creds, "_refresh_shared", False):
+        return creds
+    raw_refresh = creds.refresh
+    key = (id(creds), _token_key(getattr(creds, "refresh_token", None) or getattr(creds, "service_account_email", "") or ""))
+
+    def refresh(request):
+        stale = creds.token
+        with _refresh_lock:
+            if creds.token != stale:  # ktoś odświeżył między naszą decyzją a lockiem
+                return
+            inflight = _refresh_inflight.get(key)
+            owner = inflight is None
+            if owner:
+                inflight = _refresh_inflight[key] = Future()
+
+        if not owner:
+            inflight.result()  # ktoś już odświeża — czekamy na jego wynik (albo jego wyjątek)
+            return
+        try:
+            raw_refresh(request)
+            if on_refreshed:
+                on_refreshed(creds)
+            inflight.set_result(None)
+        except BaseException as e:
+            inflight.set_exception(e)
+            raise
+        finally:
+            with _refresh_lock:
+                _refresh_inflight.pop(key, None)
+
+    creds.refresh = refresh
+    creds._refresh_shared = True
     return creds
 
 
+class _GzipAuthorizedHttp(AuthorizedHttp):
+    """
+    Google kompresuje odpowiedź tylko, gdy user-agent zawiera "gzip" (accept-encoding dokłada httplib2).
+    Zapytania z discovery mają "(gzip)" z modelu JSON, ale zewnętrzne zapytanie batcha nie —
+    a to ono niesie do BATCH_LIMIT odpowiedzi naraz.
+    """
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        headers = dict(headers or {})
+        user_agent = headers.get("user-agent", "")
+        if "gzip" not in user_agent:
+            headers["user-agent"] = f"{user_agent} (gzip)".lstrip()
+        return super().request(uri, method, body=body, headers=headers, **kwargs)
+
+
+class _HttpPool:
+    """
+    Pula AuthorizedHttp dla jednego zestawu creds. httplib2.Http nie jest thread-safe,
+    więc każde wykonanie zapytania wypożycza osobny obiekt, ale połączenia keep-alive
+    zostają w puli i są używane przez kolejne zapytania, wątki i reruny.
+    """
+
+    def __init__(self, creds: Credentials, timeout: float = HTTP_TIMEOUT):
+        self._creds = creds
+        self._timeout = timeout
+        self._idle: deque = deque()
+
+    @contextmanager
+    def checkout(self):
+        try:
+            http = self._idle.pop()  # LIFO — najświeższe (najpewniej żywe) połączenie
+        except IndexError:
+            http = _GzipAuthorizedHttp(self._creds, http=httplib2.Http(timeout=self._timeout))
+        try:
+            yield http
+        finally:
+            self._idle.append(http)
+
+
+class _PooledHttpRequest(HttpRequest):
+    pool: Optional[_HttpPool] = None
+
+    def execute(self, http=None, num_retries=0):
+        if http is not None or self.pool is None:
+            return super().execute(http=http, num_retries=num_retries)
+        with self.pool.checkout() as pooled:
+            return super().execute(http=pooled, num_retries=num_retries)
+
+
+def build_service(api: str, version: str, creds: Credentials, **build_kwargs):
+    """
+    Klient Google API, którego można używać z wielu wątków naraz: zapytania
+    wykonują się na obiektach z puli `service.http_pool` (zob. _HttpPool), a batche —
+    z osobnej puli `service.batch_http_pool` z dłuższym timeoutem (BATCH_HTTP_TIMEOUT).
+    """
+    pool = _HttpPool(creds)
+
+    def request_builder(http, *args, **kwargs):
+        request = _PooledHttpRequest(http, *args, **kwargs)
+        request.pool = pool
+        return request
+
+    service = build(api, version, credentials=creds, requestBuilder=request_builder, **build_kwargs)
+    service.http_pool = pool
+    service.batch_http_pool = _HttpPool(creds, timeout=BATCH_HTTP_TIMEOUT)
+    return service
+
+
 def build_drive(creds: Credentials):
-    return build("drive", "v3", credentials=creds)
+    # discovery z dokumentu w paczce googleapiclient — bez HTTP i bez cache plikowego
+    return build_service("drive", "v3", creds, cache_discovery=False, static_discovery=True)
+
+
+def _checkout_http(service):
+    """Http z puli batchy serwisu; dla serwisów spoza build_service — None (domyślny transport)."""
+    pool = getattr(service, "batch_http_pool", None)
+    return pool.checkout() if pool is not None else nullcontext()
 
 # ----------------------------
 # Retry helper
 # ----------------------------
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# 403 jest przejściowe tylko przy przekroczeniu limitu zapytań (inne 403 to brak uprawnień)
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+MAX_ATTEMPTS = 6
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 60.0  # s, górny limit pojedynczego czekania (także dla Retry-After)
+
+
+def _http_status(e: HttpError) -> Optional[int]:
+    status = getattr(e, "status_code", None)
+    if status is None and hasattr(e, "resp") and hasattr(e.resp, "status"):
+        status = e.resp.status
+    return status
+
+
+def _error_reasons(e: HttpError) -> set:
+    """
+    Powody błędu z `error.errors[].reason` (format Drive v3) i z `error_details`.
+    googleapiclient wypełnia error_details z `error.details`, jeśli są, więc `errors`
+    trzeba czytać wprost z treści odpowiedzi.
+    """
+    entries: List[Any] = []
+    try:
+        error = json.loads(e.content)["error"]
+        entries.extend(error.get("errors") or [])
+    except (AttributeError, TypeError, ValueError, KeyError):
+        pass
+    details = getattr(e, "error_details", None)
+    if isinstance(details, list):
+        entries.extend(details)
+    return {d.get("reason") for d in entries if isinstance(d, dict)}
+
+
+def _header(e: HttpError, name: str) -> Optional[str]:
+    resp = getattr(e, "resp", None)
+    return resp.get(name) if hasattr(resp, "get") else None
+
+
+def _quota_exhausted(e: HttpError) -> bool:
+    return _header(e, "x-ratelimit-remaining") == "0"
+
+
+def _is_transient(e: HttpError) -> bool:
+    status = _http_status(e)
+    if status == 403:
+        return bool(_error_reasons(e) & RATE_LIMIT_REASONS) or _quota_exhausted(e)
+    return status in RETRY_STATUSES
+
+
+def _retry_delay(e: HttpError, attempt: int) -> float:
+    """
+    Czas oczekiwania przed kolejną próbą: Retry-After z odpowiedzi (jeśli liczbowy),
+    w przeciwnym razie wykładniczy backoff z jitterem, żeby równoległe wątki nie ponawiały naraz.
+    Przy wyczerpanym limicie (x-ratelimit-remaining: 0) krótkie czekanie nic nie da — od razu
+    backoff z górnej półki. Wszystko ograniczone do BACKOFF_CAP.
+    """
+    try:
+        delay = max(0.0, float(_header(e, "retry-after"))) + random.uniform(0.0, 1.0)
+    except (TypeError, ValueError):
+        if _quota_exhausted(e):
+            delay = BACKOFF_CAP * random.uniform(0.5, 1.0)
+        else:
+            delay = BACKOFF_BASE * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+    return min(BACKOFF_CAP, delay)
+
+
 def with_retries(func, *args, **kwargs):
     """
-    Prosty retry z wykładniczym backoffem na 403/429/5xx.
+    Retry z wykładniczym backoffem (z jitterem / wg Retry-After) na 429/5xx i 403 rate-limit.
+    Przekazuj funkcję wykonującą zapytanie, np. `with_retries(req.execute)` — sam builder
+    (`drive.files().get`) tylko składa zapytanie i nie rzuca HttpError.
     """
-    max_attempts = 6
-    delay = 1.0
-    for attempt in range(1, max_attempts + 1):
+    for attempt in range(1, MAX_ATTEMPTS + 1):
         try:
             return func(*args, **kwargs)
         except HttpError as e:
-            status = getattr(e, "status_code", None)
-            if status is None and hasattr(e, "resp") and hasattr(e.resp, "status"):
-                status = e.resp.status
-            if status in (403, 429, 500, 502, 503, 504):
-                if attempt == max_attempts:
-                    raise
-                time.sleep(delay)
-                delay *= 2
-            else:
+            if not _is_transient(e) or attempt == MAX_ATTEMPTS:
                 raise
+            time.sleep(_retry_delay(e, attempt))
+
+
+def execute_batch(drive, requests: Dict[str, Any]) -> Dict[str, dict]:
+    """
+    Wysyła zapytania {request_id: HttpRequest} jako batch (multipart/mixed),
+    po BATCH_LIMIT sub-requestów na jedno zapytanie HTTP.
+    Sub-requesty z błędem przejściowym (429/5xx, 403 rate-limit) są ponawiane z backoffem,
+    pozostałe błędy są rzucane. Zwraca {request_id: odpowiedź}.
+    """
+    results: Dict[str, dict] = {}
+    pending = dict(requests)
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        failed: Dict[str, HttpError] = {}
+
+        def _on_done(request_id, response, exception):
+            if exception is None:
+                results[request_id] = response
+            else:
+                failed[request_id] = exception
+
+        items = list(pending.items())
+        for i in range(0, len(items), BATCH_LIMIT):
+            batch = drive.new_batch_http_request(callback=_on_done)
+            for request_id, request in items[i:i + BATCH_LIMIT]:
+                batch.add(request, request_id=request_id)
+            with _checkout_http(drive) as http:
+                with_retries(batch.execute, http=http)
+
+        for e in failed.values():
+            if not _is_transient(e) or attempt == MAX_ATTEMPTS:
+                raise e
+        if not failed:
+            break
+        pending = {rid: pending[rid] for rid in failed}
+        time.sleep(max(_retry_delay(e, attempt) for e in failed.values()))
+    return results
 
 # ----------------------------
 # Utils
 # ----------------------------
+_ID_RE = re.compile(r"[A-Za-z0-9_\-]{20,}")
+_FOLDER_RE = re.compile(r"/folders/([A-Za-z0-9_\-]+)")
+_FILE_RE = re.compile(r"/file/d/([A-Za-z0-9_\-]+)")
+_QID_RE = re.compile(r"[?&]id=([A-Za-z0-9_\-]+)")
+
+
 def extract_id_from_url(url_or_id: str) -> str:
     """
     Obsługuje: pełny URL do folderu/plików lub czyste ID.
     """
     s = url_or_id.strip()
-    if re.fullmatch(r"[A-Za-z0-9_\-]{20,}", s):
+    if _ID_RE.fullmatch(s):
         return s
-    m = re.search(r"/folders/([A-Za-z0-9_\-]+)", s)
-    if m:
-        return m.group(1)
-    m = re.search(r"/file/d/([A-Za-z0-9_\-]+)", s)
-    if m:
-        return m.group(1)
-    m = re.search(r"[?&]id=([A-Za-z0-9_\-]+)", s)
-    if m:
-        return m.group(1)
+    # bez '/' i '=' to nie jest URL — żaden z wzorców poniżej nie ma szans trafić
+    if "/" in s or "=" in s:
+        for pattern in (_FOLDER_RE, _FILE_RE, _QID_RE):
+            m = pattern.search(s)
+            if m:
+                return m.group(1)
     raise ValueError("Nie rozpoznano ID z podanego linku/tekstu.")
 
 
@@ -126,94 +402,189 @@ def _render_root_name(template: Optional[str], src_name: str, full_name: Optiona
 # ----------------------------
 # Drive primitives
 # ----------------------------
-def create_folder(drive, name: str, parent_id: Optional[str] = None) -> dict:
+def _create_folder_request(drive, name: str, parent_id: Optional[str] = None, fields: str = "id"):
     body = {"name": name, "mimeType": FOLDER_MIME}
     if parent_id:
         body["parents"] = [parent_id]
-    return with_retries(
-        drive.files().create,
+    return drive.files().create(
         body=body,
-        fields="id,name,webViewLink,parents",
+        fields=fields,
         supportsAllDrives=True,
-    ).execute()
+    )
+
+
+def create_folder(drive, name: str, parent_id: Optional[str] = None) -> dict:
+    return with_retries(_create_folder_request(drive, name, parent_id, fields="id,name,webViewLink").execute)
+
+
+def _anyone_permission_request(drive, file_id: str, role: str):
+    perm = {"type": "anyone", "role": role, "allowFileDiscovery": False}
+    return drive.permissions().create(
+        fileId=file_id,
+        body=perm,
+        supportsAllDrives=True
+    )
 
 
 def set_anyone_with_link_permission(drive, file_id: str, role: str = "reader"):
     """
     role: "reader" | "commenter" | "writer"
     """
-    perm = {"type": "anyone", "role": role, "allowFileDiscovery": False}
-    with_retries(
-        drive.permissions().create,
+    with_retries(_anyone_permission_request(drive, file_id, role).execute)
+
+
+def _writers_can_share_request(drive, file_id: str, allow: bool):
+    return drive.files().update(
         fileId=file_id,
-        body=perm,
+        body={"writersCanShare": allow},
         supportsAllDrives=True
-    ).execute()
+    )
 
 
 # NEW: opcjonalna blokada możliwości dalszego udostępniania przez edytorów
 def set_writers_can_share(drive, file_id: str, allow: bool):  # NEW
-    with_retries(
-        drive.files().update,
-        fileId=file_id,
-        body={"writersCanShare": allow},
-        supportsAllDrives=True
-    ).execute()
+    with_retries(_writers_can_share_request(drive, file_id, allow).execute)
+
 
+# metadane celów skrótów: wiele skrótów w szablonie wskazuje zwykle na te same pliki
+_META_CACHE: Dict[Tuple[str, str], dict] = {}
+META_CACHE_SIZE = 4096
 
-def get_file(drive, file_id: str) -> dict:
-    return with_retries(
-        drive.files().get,
+
+def get_file(drive, file_id: str, cached: bool = False, fields: str = FILE_FIELDS) -> dict:
+    """
+    Metadane pliku (domyślnie FILE_FIELDS). Z `cached=True` wynik jest pamiętany w procesie —
+    tylko tam, gdzie nieaktualne metadane nie szkodzą (cele skrótów).
+    """
+    key = (file_id, fields)
+    if cached and key in _META_CACHE:
+        return _META_CACHE[key]
+    meta = with_retries(drive.files().get(
         fileId=file_id,
-        fields="id,name,mimeType,parents,shortcutDetails",
+        fields=fields,
         supportsAllDrives=True,
-    ).execute()
+    ).execute)
+    if cached:
+        if len(_META_CACHE) >= META_CACHE_SIZE:
+            _META_CACHE.clear()
+        _META_CACHE[key] = meta
+    return meta
 
 
-def list_children(drive, parent_id: str) -> Iterable[Dict[str, Any]]:
-    page_token = None
-    while True:
-        resp = with_retries(
-            drive.files().list,
-            q=f"'{parent_id}' in parents and trashed = false",
-            fields="nextPageToken, files(id,name,mimeType,shortcutDetails)",
+def clear_metadata_cache():
+    _META_CACHE.clear()
+
+
+def _list_files(drive, q: str, file_fields: str, **list_kwargs) -> Iterable[Dict[str, Any]]:
+    """
+    Wszystkie wyniki files.list strona po stronie. Następna strona jest pobierana w tle,
+    gdy wywołujący przetwarza bieżącą (najwyżej jedna strona naprzód; wątek powstaje
+    dopiero przy drugiej stronie).
+    """
+    def fetch(page_token: Optional[str]) -> dict:
+        return with_retries(drive.files().list(
+            q=q,
+            fields=f"nextPageToken, files({file_fields})",
             includeItemsFromAllDrives=True,
             supportsAllDrives=True,
             pageToken=page_token,
             pageSize=1000,
-        ).execute()
-        for f in resp.get("files", []):
-            yield f
-        page_token = resp.get("nextPageToken")
-        if not page_token:
-            break
+            **list_kwargs,
+        ).execute)
 
+    with ThreadPoolExecutor(max_workers=1) as prefetch:
+        resp = fetch(None)
+        while True:
+            page_token = resp.get("nextPageToken")
+            next_page = prefetch.submit(fetch, page_token) if page_token else None
+            yield from resp.get("files", [])
+            if next_page is None:
+                break
+            resp = next_page.result()
 
-def copy_single_file(drive, src_file: dict, dst_parent_id: str, full_name: Optional[str]) -> dict:
+
+def list_children(drive, parent_id: str) -> Iterable[Dict[str, Any]]:
+    yield from _list_files(
+        drive,
+        f"'{parent_id}' in parents and trashed = false",
+        FILE_FIELDS,
+    )
+
+
+def list_children_of(drive, parent_ids: List[str]) -> Dict[str, List[Dict[str, Any]]]:
     """
-    Kopiuje pojedynczy plik (nie-folder). Dla skrótu kopiuje *cel*,
-    zachowując nazwę skrótu (po podmianie PLACEHOLDER_TOKEN -> full_name).
+    Dzieci wielu folderów naraz — jedno zapytanie `('A' in parents or 'B' in parents ...)`
+    na LIST_PARENTS_PER_QUERY folderów zamiast osobnego listowania każdego.
+    Zwraca {parent_id: [dzieci]}.
+    """
+    by_parent: Dict[str, List[Dict[str, Any]]] = {pid: [] for pid in parent_ids}
+    for i in range(0, len(parent_ids), LIST_PARENTS_PER_QUERY):
+        parents_q = " or ".join(f"'{pid}' in parents" for pid in parent_ids[i:i + LIST_PARENTS_PER_QUERY])
+        for f in _list_files(drive, f"({parents_q}) and trashed = false", f"{FILE_FIELDS},parents"):
+            for pid in f.get("parents", []):
+                if pid in by_parent:
+                    by_parent[pid].append(f)
+    return by_parent
+
+
+def list_all_descendants(drive, drive_id: str) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Cała zawartość Dysku współdzielonego jednym stronicowanym files.list (corpora=drive)
+    zamiast zapytania na każdy poziom drzewa; drzewo składane lokalnie z `parents`.
+    Opłaca się tylko, gdy klonujemy cały Dysk (jego root). Zwraca {parent_id: [dzieci]}.
+    """
+    by_parent: Dict[str, List[Dict[str, Any]]] = {}
+    for f in _list_files(drive, "trashed = false", f"{FILE_FIELDS},parents", corpora="drive", driveId=drive_id):
+        for pid in f.get("parents", []):
+            by_parent.setdefault(pid, []).append(f)
+    return by_parent
+
+
+def _copy_request(drive, src_file: dict, dst_parent_id: str, full_name: Optional[str], fields: str = "id"):
+    """
+    Buduje (bez wykonywania) zapytanie files.copy dla pliku (nie-folderu).
+    Dla skrótu kopiuje *cel*, zachowując nazwę skrótu (po podmianie PLACEHOLDER_TOKEN -> full_name).
+    Zwraca None, gdy skrót nie ma celu albo łańcuch skrótów się zapętla.
+    Domyślnie odpowiedź zawiera tylko `id` (batch kopiowania niczego więcej nie czyta).
     """
-    mime = src_file["mimeType"]
     desired_name = _rename_with_placeholder(src_file["name"], full_name)
 
-    if mime == SHORTCUT_MIME:
-        target_id = src_file.get("shortcutDetails", {}).get("targetId")
-        if not target_id:
-            return {}
-        real_src = get_file(drive, target_id)
-        # narzuć nazwę po podmianie placeholdera
-        real_src = {**real_src, "name": desired_name}
-        return copy_single_file(drive, real_src, dst_parent_id, full_name)
+    # łańcuch skrótów idziemy pętlą; `seen` chroni przed cyklem
+    src_id = src_file["id"]
+    details = src_file.get("shortcutDetails", {}) if src_file["mimeType"] == SHORTCUT_MIME else None
+    seen = set()
+    while details is not None:
+        target_id = details.get("targetId")
+        if not target_id or target_id in seen:
+            return None
+        seen.add(target_id)
+        src_id = target_id
+        if details.get("targetMimeType") == SHORTCUT_MIME:
+            # skrót do skrótu — metadane celu są potrzebne, żeby pójść dalej
+            target = get_file(drive, target_id, cached=True)
+            details = target.get("shortcutDetails", {}) if target["mimeType"] == SHORTCUT_MIME else None
+        else:
+            # cel znany już z listingu — kopiujemy go bez dodatkowego files.get
+            details = None
 
     body = {"name": desired_name, "parents": [dst_parent_id]}
-    return with_retries(
-        drive.files().copy,
-        fileId=src_file["id"],
+    return drive.files().copy(
+        fileId=src_id,
         body=body,
-        fields="id,name,webViewLink",
+        fields=fields,
         supportsAllDrives=True,
-    ).execute()
+    )
+
+
+def copy_single_file(drive, src_file: dict, dst_parent_id: str, full_name: Optional[str]) -> dict:
+    """
+    Kopiuje pojedynczy plik (nie-folder). Dla skrótu kopiuje *cel*,
+    zachowując nazwę skrótu (po podmianie PLACEHOLDER_TOKEN -> full_name).
+    """
+    request = _copy_request(drive, src_file, dst_parent_id, full_name, fields="id,name,webViewLink")
+    if request is None:
+        return {}
+    return with_retries(request.execute)
 
 
 def clone_folder_tree(
@@ -222,12 +593,20 @@ def clone_folder_tree(
     dst_parent_id: Optional[str],
     full_name: Optional[str],
     root_name_template: Optional[str] = None,
-) -> Tuple[str, str]:
+    progress_cb: Optional[Callable[[int, int], None]] = None,
+    max_workers: int = COPY_WORKERS,
+    on_root_created: Optional[Callable[[str], Any]] = None,
+    placeholder_items: Optional[List[Dict[str, str]]] = None,
+) -> dict:
     """
-    Rekurencyjnie klonuje folder źródłowy, podmieniając PLACEHOLDER_TOKEN w nazwach.
-    Zwraca (new_folder_id, new_folder_webViewLink).
+    Klonuje folder źródłowy, podmieniając PLACEHOLDER_TOKEN w nazwach: tworzy root, potem
+    szkielet podfolderów poziom po poziomie (BFS) i kopiuje pliki batchami (clone_folder_tree_into).
+    `on_root_created(new_folder_id)` (np. nadanie uprawnień) biegnie w osobnym wątku
+    równolegle z kopiowaniem zawartości; jego błąd jest rzucany po zakończeniu klonowania.
+    `placeholder_items` — zob. clone_folder_tree_into.
+    Zwraca metadane nowego folderu {id, name, webViewLink} (z odpowiedzi files.create).
     """
-    src = get_file(drive, src_folder_id)
+    src = get_file(drive, src_folder_id, fields=f"{FILE_FIELDS},driveId")
     if src["mimeType"] != FOLDER_MIME:
         raise ValueError("Podane ID/URL wskazuje na plik, a nie folder.")
 
@@ -236,26 +615,140 @@ def clone_folder_tree(
     dst_folder = create_folder(drive, dst_name, parent_id=dst_parent_id)
     dst_folder_id = dst_folder["id"]
 
-    # dzieci:
-    for child in list_children(drive, src_folder_id):
-        if child["mimeType"] == FOLDER_MIME:
-            sub_name = _rename_with_placeholder(child["name"], full_name)
-            sub_dst = create_folder(drive, sub_name, parent_id=dst_folder_id)
-            clone_folder_tree_into(drive, child["id"], sub_dst["id"], full_name)
-        else:
-            copy_single_file(drive, child, dst_folder_id, full_name)
+    root_job = None
+    if on_root_created:
+        executor = ThreadPoolExecutor(max_workers=1)
+        root_job = executor.submit(on_root_created, dst_folder_id)
+        executor.shutdown(wait=False)
+
+    # dzieci: gdy źródłem jest sam Dysk współdzielony, całe drzewo jednym listowaniem;
+    # podfolder dużego Dysku listujemy poziomami (inaczej stronicowalibyśmy cały Dysk)
+    drive_id = src.get("driveId")
+    children_by_parent = list_all_descendants(drive, drive_id) if drive_id and drive_id == src_folder_id else None
+    clone_folder_tree_into(
+        drive, src_folder_id, dst_folder_id, full_name,
+        progress_cb=progress_cb, max_workers=max_workers, placeholder_items=placeholder_items,
+        children_by_parent=children_by_parent,
+    )
+    if root_job:
+        root_job.result()
 
-    return dst_folder_id, dst_folder.get("webViewLink")
+    return dst_folder
 
 
-def clone_folder_tree_into(drive, src_folder_id: str, dst_folder_id: str, full_name: Optional[str]):
-    for child in list_children(drive, src_folder_id):
-        if child["mimeType"] == FOLDER_MIME:
-            sub_name = _rename_with_placeholder(child["name"], full_name)
-            sub_dst = create_folder(drive, sub_name, parent_id=dst_folder_id)
-            clone_folder_tree_into(drive, child["id"], sub_dst["id"], full_name)
+def _create_folder_skeleton(
+    drive,
+    src_folder_id: str,
+    dst_folder_id: str,
+    full_name: Optional[str],
+    file_jobs: List[Tuple[dict, str]],
+    placeholder_items: Optional[List[Dict[str, str]]] = None,
+    children_by_parent: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+):
+    """
+    Odtwarza strukturę podfolderów poziom po poziomie (BFS): dzieci całego poziomu
+    są listowane zbiorczo (list_children_of) albo brane z gotowej mapy `children_by_parent`
+    (list_all_descendants), a nowe podfoldery tworzone jednym batchem.
+    Pliki do skopiowania trafiają do `file_jobs` jako pary (plik źródłowy, id folderu docelowego).
+    """
+    level = {src_folder_id: dst_folder_id}  # src_id -> dst_id folderów bieżącego poziomu
+    while level:
+        if children_by_parent is not None:
+            children = {pid: children_by_parent.get(pid, []) for pid in level}
         else:
-            copy_single_file(drive, child, dst_folder_id, full_name)
+            children = list_children_of(drive, list(level))
+        subfolders = []
+        for src_id, dst_id in level.items():
+            for child in children[src_id]:
+                if child["mimeType"] == FOLDER_MIME:
+                    subfolders.append((child, dst_id))
+                else:
+                    file_jobs.append((child, dst_id))
+
+        names = [_rename_with_placeholder(child["name"], full_name) for child, _ in subfolders]
+        created = execute_batch(drive, {
+            str(i): _create_folder_request(drive, names[i], dst_id)
+            for i, (_, dst_id) in enumerate(subfolders)
+        })
+        level = {child["id"]: created[str(i)]["id"] for i, (child, _) in enumerate(subfolders)}
+        if placeholder_items is not None:
+            placeholder_items.extend(
+                {"id": created[str(i)]["id"], "name": name, "mimeType": FOLDER_MIME}
+                for i, name in enumerate(names) if PLACEHOLDER_TOKEN in name
+            )
+
+
+def _copy_files(
+    drive,
+    file_jobs: List[Tuple[dict, str]],
+    full_name: Optional[str],
+    placeholder_items: Optional[List[Dict[str, str]]] = None,
+) -> Dict[str, dict]:
+    # klucze pozycyjne — ten sam plik może mieć kilku rodziców w drzewie źródłowym
+    requests = {}
+    for i, (src_file, dst_folder_id) in enumerate(file_jobs):
+        request = _copy_request(drive, src_file, dst_folder_id, full_name)
+        if request is not None:
+            requests[str(i)] = request
+    results = execute_batch(drive, requests)
+
+    if placeholder_items is not None:
+        for key, copied in results.items():
+            src_file = file_jobs[int(key)][0]
+            name = _rename_with_placeholder(src_file["name"], full_name)
+            if PLACEHOLDER_TOKEN in name:
+                mime = src_file.get("shortcutDetails", {}).get("targetMimeType", src_file["mimeType"])
+                placeholder_items.append({"id": copied["id"], "name": name, "mimeType": mime})
+    return results
+
+
+def clone_folder_tree_into(
+    drive,
+    src_folder_id: str,
+    dst_folder_id: str,
+    full_name: Optional[str],
+    progress_cb: Optional[Callable[[int, int], None]] = None,
+    max_workers: int = COPY_WORKERS,
+    placeholder_items: Optional[List[Dict[str, str]]] = None,
+    children_by_parent: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+):
+    """
+    Klonuje zawartość folderu do istniejącego folderu docelowego.
+    Najpierw powstają wszystkie podfoldery, potem pliki są kopiowane batchami
+    (do BATCH_LIMIT na zapytanie) w `max_workers` wątkach.
+    `progress_cb(done, total)` jest wołany w wątku wywołującym po każdym batchu.
+    Do `placeholder_items` (jeśli podana) trafiają {id, name, mimeType} kopii, których nazwa
+    nadal zawiera PLACEHOLDER_TOKEN — to samo, co zwróciłby find_items_with_placeholder, bez ponownego przejścia drzewa.
+    `children_by_parent` (z list_all_descendants) zastępuje listowanie folderów źródłowych.
+    """
+    file_jobs: List[Tuple[dict, str]] = []
+    _create_folder_skeleton(
+        drive, src_folder_id, dst_folder_id, full_name, file_jobs, placeholder_items, children_by_parent,
+    )
+
+    total = len(file_jobs)
+    if progress_cb:
+        progress_cb(0, total)
+    if not total:
+        return
+
+    max_workers = max(1, max_workers)
+    # małe drzewa też rozkładamy na wszystkie wątki
+    chunk_size = max(1, min(BATCH_LIMIT, -(-total // max_workers)))
+    chunks = [file_jobs[i:i + chunk_size] for i in range(0, total, chunk_size)]
+    done = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(_copy_files, drive, chunk, full_name, placeholder_items): len(chunk) for chunk in chunks}
+        try:
+            for future in as_completed(futures):
+                future.result()
+                done += futures[future]
+                if progress_cb:
+                    progress_cb(done, total)
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
 
 
 def copy_disk(
@@ -266,40 +759,54 @@ def copy_disk(
     root_name_template: Optional[str] = None,
     lock_editors_sharing: bool = False,      # NEW: writersCanShare=False gdy True
     dst_parent_id: Optional[str] = None,     # NEW: ID folderu docelowego (np. na My Drive konta-bota)
+    progress_cb: Optional[Callable[[int, int], None]] = None,  # progress_cb(skopiowane, wszystkie) pliki
+    max_workers: int = COPY_WORKERS,
 ) -> dict:
     """
     Klonuje cały folder (traktowany jako „dysk”), podmienia PLACEHOLDER_TOKEN w nazwach
     na `full_name`, (opcjonalnie) nadaje uprawnienia 'anyone with link',
     (opcjonalnie) blokuje możliwość dalszego udostępniania przez edytorów,
-    zwraca metadane nowego folderu.
+    zwraca metadane nowego folderu; pod kluczem "placeholder_items" — elementy, w których nazwie
+    PLACEHOLDER_TOKEN został (np. bez `full_name`), jak z find_items_with_placeholder.
     Jeśli `root_name_template` jest podany, nazwa roota będzie z niego wyrenderowana.
     Jeśli `dst_parent_id` jest podany – nowy root zostanie utworzony *we wskazanym folderze*.
     """
     src_id = extract_id_from_url(source_link_or_id)
-    new_root_id, _ = clone_folder_tree(
+
+    # ustawienia udostępniania dotyczą tylko roota — lecą równolegle z kopiowaniem zawartości
+    def _share_root(root_id: str):
+        # oba ustawienia naraz → jeden batch zamiast dwóch zapytań
+        if anyone_role and lock_editors_sharing:
+            execute_batch(drive, {
+                "anyone": _anyone_permission_request(drive, root_id, anyone_role),
+                "lock": _writers_can_share_request(drive, root_id, allow=False),
+            })
+            return
+
+        # 1) (opcjonalnie) „anyone with link” (reader/commenter/writer)
+        if anyone_role:
+            set_anyone_with_link_permission(drive, root_id, role=anyone_role)
+
+        # 2) (opcjonalnie) zablokuj share przez edytorów (writersCanShare=false)
+        if lock_editors_sharing:
+            set_writers_can_share(drive, root_id, allow=False)
+
+    placeholder_items: List[Dict[str, str]] = []
+    new_root = clone_folder_tree(
         drive,
         src_id,
         dst_parent_id=dst_parent_id,  # <-- ważne: tworzymy kopię we wskazanym folderze
         full_name=full_name.strip() if isinstance(full_name, str) else full_name,
         root_name_template=root_name_template,
+        progress_cb=progress_cb,
+        max_workers=max_workers,
+        on_root_created=_share_root if anyone_role or lock_editors_sharing else None,
+        placeholder_items=placeholder_items,
     )
 
-    # 1) (opcjonalnie) „anyone with link” (reader/commenter/writer)
-    if anyone_role:
-        set_anyone_with_link_permission(drive, new_root_id, role=anyone_role)
-
-    # 2) (opcjonalnie) zablokuj share przez edytorów (writersCanShare=false)
-    if lock_editors_sharing:
-        # zakładamy, że masz helper set_writers_can_share(drive, file_id, allow: bool)
-        set_writers_can_share(drive, new_root_id, allow=False)
-
-    # zwrot metadanych
-    return with_retries(
-        drive.files().get,
-        fileId=new_root_id,
-        fields="id,name,webViewLink",
-        supportsAllDrives=True
-    ).execute()
+    # zwrot metadanych — id/name/webViewLink są już w odpowiedzi files.create
+    # (uprawnienia i writersCanShare ich nie zmieniają)
+    return {**new_root, "placeholder_items": placeholder_items}
 
 # ----------------------------
 # Narzędzia testowe / walidacja
@@ -308,18 +815,17 @@ def find_items_with_placeholder(drive, root_folder_id: str) -> Iterable[Dict[str
     """
     Zwraca generator słowników {id, name, mimeType} dla elementów,
     których nazwa nadal zawiera PLACEHOLDER_TOKEN (do sanity-checku po klonowaniu).
+    Dla kopii z copy_disk ta sama lista jest już w wyniku pod "placeholder_items";
+    to przejście zostaje dla drzew sklonowanych inaczej.
     """
-    def _walk(folder_id: str):
-        for child in list_children(drive, folder_id):
+    # BFS na jawnej kolejce — głębokość drzewa nie jest ograniczona limitem rekurencji
+    queue = deque([root_folder_id])
+    while queue:
+        for child in list_children(drive, queue.popleft()):
+            if PLACEHOLDER_TOKEN in child["name"]:
+                yield {"id": child["id"], "name": child["name"], "mimeType": child["mimeType"]}
             if child["mimeType"] == FOLDER_MIME:
-                if PLACEHOLDER_TOKEN in child["name"]:
-                    yield {"id": child["id"], "name": child["name"], "mimeType": child["mimeType"]}
-                yield from _walk(child["id"])
-            else:
-                if PLACEHOLDER_TOKEN in child["name"]:
-                    yield {"id": child["id"], "name": child["name"], "mimeType": child["mimeType"]}
-
-    yield from _walk(root_folder_id)
+                queue.append(child["id"])
 
 # ----------------------------
 # CLI demo (opcjonalne do lokalnych testów)
@@ -0,0 +1,191 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+import httplib2
+from google.oauth2.credentials import Credentials
+from googleapiclient.errors import HttpError
+
+import google_drive_manager as gdm
+
+
+class _CountingCredentials(Credentials):
+    def __init__(self):
+        super().__init__(token="old", refresh_token="refresh-token")
+        self.expiry = datetime.utcnow() - timedelta(minutes=5)
+        self.refresh_calls = 0
+
+    def refresh(self, request):
+        self.refresh_calls += 1
+        time.sleep(0.2)  # okno, w którym pozostałe wątki też widzą wygasły token
+        self.token = "new"
+        self.expiry = datetime.utcnow() + timedelta(hours=1)
+
+
+class _FakeHttp(httplib2.Http):
+    def __init__(self, seen):
+        super().__init__()
+        self.seen = seen
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        self.seen.append(headers.get("authorization"))
+        return httplib2.Response({"status": "200"}), b"{}"
+
+
+class ShareRefreshTest(unittest.TestCase):
+    def test_concurrent_requests_refresh_expired_token_once(self):
+        creds = gdm.share_refresh(_CountingCredentials())
+        seen = []
+        pool = gdm._HttpPool(creds)
+        workers = 8
+        for _ in range(workers):
+            pool._idle.append(gdm._GzipAuthorizedHttp(creds, http=_FakeHttp(seen)))
+
+        start = threading.Barrier(workers)
+        errors = []
+
+        def call():
+            start.wait()
+            try:
+                with pool.checkout() as http:
+                    http.request("https://www.googleapis.com/drive/v3/files")
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(workers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(creds.refresh_calls, 1)
+        self.assertEqual(seen, ["Bearer new"] * workers)
+
+    def test_refresh_error_reaches_every_waiter(self):
+        class Failing(_CountingCredentials):
+            def refresh(self, request):
+                self.refresh_calls += 1
+                time.sleep(0.2)
+                raise gdm.RefreshError("invalid_grant")
+
+        creds = gdm.share_refresh(Failing())
+        start = threading.Barrier(4)
+        failures = []
+
+        def call():
+            start.wait()
+            try:
+                creds.refresh(None)
+            except gdm.RefreshError:
+                failures.append(True)
+
+        threads = [threading.Thread(target=call) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(creds.refresh_calls, 1)
+        self.assertEqual(len(failures), 4)
+
+    def test_credentials_sharing_a_grant_each_get_a_token(self):
+        drive_creds = gdm.share_refresh(_CountingCredentials())
+        gmail_creds = gdm.share_refresh(_CountingCredentials())
+        start = threading.Barrier(2)
+
+        def call(creds):
+            start.wait()
+            creds.refresh(None)
+
+        threads = [threading.Thread(target=call, args=(c,)) for c in (drive_creds, gmail_creds)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(drive_creds.token, "new")
+        self.assertEqual(gmail_creds.token, "new")
+
+
+class GetCredsTest(unittest.TestCase):
+    def setUp(self):
+        cwd = os.getcwd()
+        tmp = tempfile.TemporaryDirectory()
+        os.chdir(tmp.name)
+        self.addCleanup(tmp.cleanup)
+        self.addCleanup(os.chdir, cwd)
+        self.addCleanup(setattr, gdm, "_creds", None)
+        self.addCleanup(setattr, gdm, "_saved_token", None)
+        gdm._creds = gdm._saved_token = None
+        with open("token.json", "w") as f:
+            json.dump({
+                "token": "old", "refresh_token": "cli-refresh-token",
+                "client_id": "id", "client_secret": "secret", "expiry": "2099-01-01T00:00:00Z",
+            }, f)
+
+    def test_get_creds_while_transport_refreshes(self):
+        refreshing = threading.Event()
+        calls = []
+
+        def raw_refresh(creds, request):
+            calls.append(1)
+            refreshing.set()
+            time.sleep(0.3)  # get_creds() w drugim wątku trafia na trwające odświeżenie
+            creds.token = "new"
+            creds.expiry = datetime.utcnow() + timedelta(hours=1)
+
+        with mock.patch.object(Credentials, "refresh", raw_refresh):
+            creds = gdm.get_creds()
+            creds.expiry = datetime.utcnow() - timedelta(minutes=5)
+
+            transport = threading.Thread(target=creds.before_request, args=(None, "GET", "https://x", {}), daemon=True)
+            cli = threading.Thread(target=gdm.get_creds, daemon=True)
+            transport.start()
+            refreshing.wait(1)
+            cli.start()
+            transport.join(5)
+            cli.join(5)
+
+        self.assertFalse(transport.is_alive() or cli.is_alive(), "deadlock")
+        self.assertEqual(len(calls), 1)
+        with open("token.json") as f:
+            self.assertEqual(json.load(f)["token"], "new")
+
+
+def _http_error(status, error):
+    return HttpError(httplib2.Response({"status": str(status)}), json.dumps({"error": error}).encode("utf-8"))
+
+
+class TransientErrorTest(unittest.TestCase):
+    RATE_LIMITED = [{"domain": "usageLimits", "reason": "userRateLimitExceeded", "message": "slow down"}]
+
+    def test_rate_limit_403_with_errors_only(self):
+        e = _http_error(403, {"code": 403, "message": "slow down", "errors": self.RATE_LIMITED})
+        self.assertTrue(gdm._is_transient(e))
+
+    def test_rate_limit_403_with_details_and_errors(self):
+        e = _http_error(403, {
+            "code": 403,
+            "message": "slow down",
+            "errors": self.RATE_LIMITED,
+            "details": [{"@type": "type.googleapis.com/google.rpc.ErrorInfo", "reason": "OTHER"}],
+        })
+        self.assertTrue(gdm._is_transient(e))
+
+    def test_permission_403_is_not_retried(self):
+        e = _http_error(403, {
+            "code": 403,
+            "message": "forbidden",
+            "errors": [{"domain": "global", "reason": "insufficientFilePermissions"}],
+        })
+        self.assertFalse(gdm._is_transient(e))
+
+
+if __name__ == "__main__":
+    unittest.main()